@@ -1,16 +1,24 @@
 import os
-import string
-import re
-import nltk
+import csv
 import random as rand
-import pandas as pd
-from nltk.corpus import stopwords
-from collections import Counter
 from WordState import WordState
+from MixtureModel import MixtureModel
 
 
 DEFAULT_DATA = "PoetryFoundationData.csv"
 DEFAULT_COLUMN = "Poem"
+#greedy or truncated sampling can cycle without ever reaching a last word
+MAX_WORDS_PER_SENTENCE = 200
+COMMON_TAGS : dict = { 
+    "1": "Time", 
+    "2": "Love", 
+    "3": "Nature", 
+    "4": "Social Commentaries", 
+    "5": "Mythology & Folklore", 
+    "6": "Arts & Sciences", 
+    "7": "Living", 
+    "8": None
+}
 
 
 def main():
@@ -29,6 +37,8 @@ def main():
                     generate_poems_for_default_data(data, column)
                 elif user_input == "2":
                     data = change_training_data_source()
+                elif user_input == "3":
+                    generate_blended_sentences(column)
                 elif user_input == "0":
                     keep_running = False
             else:
@@ -37,38 +47,69 @@ def main():
                     generate_sentences_for_non_default_data(data)
                 elif user_input == "2":
                     data = change_training_data_source()
+                elif user_input == "3":
+                    generate_blended_sentences(column)
                 elif user_input == "0":
                     keep_running = False    
         except FileNotFoundError:
             print("File not found. Try again.")
 
     
-def read_and_parse_text(file: str, column=None, category=None) -> pd.DataFrame:
+def read_poem_lines(
+        file: str, column: str, category=None, lower_casing: bool = True
+):
     """
-    Reads and parses text from a CSV file.
+    Reads the lines of every poem in a CSV file without building a DataFrame.
+    Quoted multi-line fields are handled by the csv module.
 
     Arguments:
-    file (string)    : The path to the CSV/text file.
-    column (string)  : The name of the column to read from. 
-                       If None, reads from the first column.
-    category (string): The category to filter by. If None, returns all rows.
+    file (string)       : The path to the CSV file.
+    column (string)     : The name of the column holding the poems.
+    category (string)   : The category to filter by. If None, reads all rows.
+    lower_casing (bool) : Whether to convert all text to lowercase.
 
-    Returns:
-    pd.DataFrame: The parsed text.
+    Yields:
+    string: Each line of each poem, in file order.
     """
 
-    if column is None:
-        text = pd.read_csv(file, header=None)
-        text = text[0]
-        return text
-    else:
-        text = pd.read_csv(file)
-        if category is not None:
-            text = text[text['Tags'].str.contains(category, na=False)][column]
-        else:
-            text = text[column]
-        return text
-   
+    with open(file, "r", encoding="utf8", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        poem_index = header.index(column)
+        tags_index = header.index("Tags") if category is not None else None
+
+        for row in reader:
+            #ragged rows are missing the fields pandas would fill with NaN
+            if len(row) <= max(poem_index, tags_index or 0):
+                continue
+            if category is not None and category not in row[tags_index]:
+                continue
+
+            poem = row[poem_index]
+            if lower_casing:
+                poem = poem.lower()
+
+            yield from poem.split("\n")
+
+
+def read_folder_lines(folder: str, lower_casing: bool = True):
+    """
+    Reads the lines of every text file in a folder.
+
+    Arguments:
+    folder (string)     : The path to the folder containing the text files.
+    lower_casing (bool) : Whether to convert all text to lowercase.
+
+    Yields:
+    string: Each stripped line of each file.
+    """
+
+    for filename in os.listdir(folder):
+        with open(os.path.join(folder, filename), 'r') as file:
+            for line in file:
+                line = line.strip()
+                yield line.lower() if lower_casing else line
+
 
 def word_states(sentences: list) -> dict:
     """
@@ -106,17 +147,17 @@ def word_states(sentences: list) -> dict:
     return states
 
 
-def generate_sentences(sentences : list , num_sentences : int):
-
+def train_states(sentences) -> dict:
     """
-    Generates sentences based on the training data using the class WordState.
+    Trains a chain of word states on the training data.
 
     Arguments:
-    sentences (list): A list of sentences used as training data.
-    num_sentences (int): The number of sentences to generate.
+    sentences: Any iterable of lines used as training data, such as the
+               generators from read_poem_lines and read_folder_lines.
+               It is iterated only once.
 
     Returns:
-    list: A list of generated sentences based on the training data.
+    dict: A dictionary mapping each word to its WordState.
     """
     states : dict = {"#": WordState()}
     for sentence in sentences:
@@ -133,6 +174,33 @@ def generate_sentences(sentences : list , num_sentences : int):
         if previous_word not in states:
             states[previous_word] = WordState()
 
+    return states
+
+
+def sample_sentences(
+        states,
+        num_sentences : int,
+        temperature   : float = 1.0,
+        top_k         : int   = 0,
+        top_p         : float = 1.0
+) -> list:
+    """
+    Samples sentences from already trained word states.
+
+    Arguments:
+    states: A dictionary of WordStates as returned by train_states,
+            or a MixtureModel blending several of them.
+    num_sentences (int): The number of sentences to generate.
+    temperature (float): Sampling temperature. 0 always picks the most
+                         frequent next word.
+    top_k (int): Only sample from the k most frequent next words.
+                 0 for no limit.
+    top_p (float): Only sample from the most frequent next words whose
+                   probabilities add up to at least top_p.
+
+    Returns:
+    list: A list of generated sentences.
+    """
     sentences = []
 
     for i in range(num_sentences):
@@ -142,226 +210,41 @@ def generate_sentences(sentences : list , num_sentences : int):
             sentence.append(current_word)
             if not states[current_word].has_next():
                 break
-            current_word = states[current_word].get_next()
+            if len(sentence) > MAX_WORDS_PER_SENTENCE:
+                break
+            current_word = states[current_word].get_next(
+                temperature, top_k, top_p
+            )
         sentences.append(" ".join(sentence[1:]))
 
     return sentences
 
 
-def lower_case(text : pd.DataFrame):
-    return text.str.lower()
-
-
-def remove_punctuations(text : pd.DataFrame):
-    return text.apply(
-        lambda x: x.translate(str.maketrans('', '', string.punctuation))
-    )
-
-
-def remove_stopwords(text : pd.DataFrame):
-    nltk.download('stopwords')
-    STOPWORDS = set(stopwords.words('english'))
-    return text.apply(
-        lambda x: " ".join(
-            [word for word in x.split() if word not in STOPWORDS]
-        )
-    )
-
-
-def remove_frequent_words(text : pd.DataFrame, frequent_words_to_remove : int):
-    counter = Counter()
-    for value in text.values:
-        for word in value.split():
-            counter[word] += 1
-
-    FREQUENT_WORDS = set(
-        [
-            word for (word, count) 
-            in counter.most_common(frequent_words_to_remove)
-        ]
-    )
-
-    return text.apply(
-        lambda x: " ".join(
-            [word for word in x.split() if word not in FREQUENT_WORDS]
-        )
-    )
-
-
-def remove_rare_words(text : pd.DataFrame, rare_words_to_remove : int):
-    counter = Counter()
-    for value in text.values:
-        for word in value.split():
-            counter[word] += 1
-
-    RARE_WORDS = set(
-        [
-            word for (word, count) 
-            in counter.most_common()[:-rare_words_to_remove-1:-1]
-        ]
-    )
-
-    return text.apply(
-        lambda x: " ".join(
-            [word for word in x.split() if word not in RARE_WORDS]
-        )
-    )
-
-
-def remove_emojis(text : pd.DataFrame):
-    emoji_pattern = re.compile("["
-                    u"\U0001F600-\U0001F64F"  # emoticons
-                    u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-                    u"\U0001F680-\U0001F6FF"  # transport & map symbols
-                    u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                    u"\U00002702-\U000027B0"
-                    u"\U000024C2-\U0001F251"
-                    "]+", flags=re.UNICODE)
-
-    return text.apply(lambda x: emoji_pattern.sub(r'', x))
-
-
-def remove_emoticons(text : pd.DataFrame):
-    EMOTICONS = {
-        u":‑\)":"Happy face or smiley",
-        u":\)":"Happy face or smiley",
-        u":-\]":"Happy face or smiley",
-        u":\]":"Happy face or smiley",
-        u":-3":"Happy face smiley",
-        u":3":"Happy face smiley",
-        u":->":"Happy face smiley",
-        u":>":"Happy face smiley",
-        u"8-\)":"Happy face smiley",
-        u":o\)":"Happy face smiley",
-        u":-\}":"Happy face smiley",
-        u":\}":"Happy face smiley",
-        u":-\)":"Happy face smiley",
-        u":c\)":"Happy face smiley",
-        u":\^\)":"Happy face smiley",
-        u"=\]":"Happy face smiley",
-        u"=\)":"Happy face smiley"
-    }
-
-    emoticon_pattern = re.compile(
-        u'(' + u'|'.join(k for k in EMOTICONS) + u')'
-    )
-
-    return text.apply(lambda x: emoticon_pattern.sub(r'', x))
-
-
-def convert_emoticons_to_words(text : pd.DataFrame):
-    EMOTICONS = {
-        u":‑\)":"Happy face or smiley",
-        u":\)":"Happy face or smiley",
-        u":-\]":"Happy face or smiley",
-        u":\]":"Happy face or smiley",
-        u":-3":"Happy face smiley",
-        u":3":"Happy face smiley",
-        u":->":"Happy face smiley",
-        u":>":"Happy face smiley",
-        u"8-\)":"Happy face smiley",
-        u":o\)":"Happy face smiley",
-        u":-\}":"Happy face smiley",
-        u":\}":"Happy face smiley",
-        u":-\)":"Happy face smiley",
-        u":c\)":"Happy face smiley",
-        u":\^\)":"Happy face smiley",
-        u"=\]":"Happy face smiley",
-        u"=\)":"Happy face smiley"
-    }
-
-    for emoticon in EMOTICONS:
-        text = re.sub(
-            u'('+emoticon+')', 
-            "_".join(EMOTICONS[emoticon].replace(",","").split()), 
-            text
-        )
-
-    return text
-
-
-def remove_urls(text : pd.DataFrame):
-    url_pattern = re.compile(r'https?://\S+|www\.\S+')
-    return text.apply(lambda x: url_pattern.sub(r'', x))
-
-
-def preprocess_text(
-        data: pd.DataFrame, 
-        lower_casing               : bool = True, 
-        remove_punctuations        : bool = False,
-        remove_stopwords           : bool = False, 
-        frequent_words_to_remove   : int  = 0,
-        rare_words_to_remove       : int  = 0,
-        remove_emojis              : bool = False,
-        remove_emoticons           : bool = False,
-        convert_emoticons_to_words : bool = False,
-        remove_urls                : bool = False
+def generate_sentences(
+        sentences     : list,
+        num_sentences : int,
+        temperature   : float = 1.0,
+        top_k         : int   = 0,
+        top_p         : float = 1.0
 ):
-    """
-    Preprocesses text by applying a series of transformations.
-    Arguments:
-    data (pd.DataFrame): The text to preprocess.
-    lower_casing (bool): Whether to convert all text to lowercase.
-    remove_punctuations (bool): Whether to remove all punctuations.
-    remove_stopwords (bool): Whether to remove all stopwords.
-    frequent_words_to_remove (int): Number of most frequent words to remove.
-    rare_words_to_remove (int): The number of most rare words to remove.
-    remove_emojis (bool): Whether to remove all emojis.
-    remove_emoticons (bool): Whether to remove all emoticons.
-    convert_emoticons_to_words (bool): Whether to convert emoticons to words.
-    remove_urls (bool): Whether to remove all URLs.
-    Returns:
-    pd.DataFrame: The preprocessed text.
-    """
-    text = data.copy()
-
-    if lower_casing:
-        text = lower_case(text)
-    
-    if remove_punctuations:
-        text = remove_punctuations(text)
-
-    if remove_stopwords:
-        text = remove_stopwords(text)
-
-    if frequent_words_to_remove > 0:
-        text = remove_frequent_words(text, frequent_words_to_remove)
-
-    if rare_words_to_remove > 0:
-        text = remove_rare_words(text, rare_words_to_remove)
-
-    if remove_emojis:
-        text = remove_emojis(text)
-
-    if remove_emoticons:
-        text = remove_emoticons(text)
-
-    if convert_emoticons_to_words:
-        text = convert_emoticons_to_words(text)
-
-    if remove_urls:
-        text = remove_urls(text)
-
-    return text
-
 
-def sentences_from_poems(poems : pd.DataFrame) -> list:
     """
-    Splits poems into sentences.
+    Generates sentences based on the training data using the class WordState.
+
     Arguments:
-    poems (pd.DataFrame): A dataframe of poems.
+    sentences (list): A list of sentences used as training data.
+    num_sentences (int): The number of sentences to generate.
+    temperature (float): Sampling temperature, see sample_sentences.
+    top_k (int): Top-k truncation, see sample_sentences.
+    top_p (float): Top-p truncation, see sample_sentences.
+
     Returns:
-    list: A list containing all the sentences from the poems.
+    list: A list of generated sentences based on the training data.
     """
-    sentences = []
-
-    for poem in poems:
-        sentences.append(poem.split("\n"))
-    
-    #list of lists to list of strings
-    sentences = [sentence for poem in sentences for sentence in poem]
-
-    return sentences
+    states = train_states(sentences)
+    return sample_sentences(
+        states, num_sentences, temperature, top_k, top_p
+    )
 
 
 def process_output_poems(
@@ -459,7 +342,10 @@ def generate_poems(
         amount_of_poems : int, 
         number_of_lines : int,
         number_of_words : int, 
-        category        : str 
+        category        : str,
+        temperature     : float = 1.0,
+        top_k           : int   = 0,
+        top_p           : float = 1.0
 ):
     """
     Prints generated poems.
@@ -471,22 +357,27 @@ def generate_poems(
     number_of_lines (int): The number of lines per poem.
     number_of_words (int): The number of words per line.
     category (string): The category to filter by. If None, returns all rows.
+    temperature (float): Sampling temperature, see sample_sentences.
+    top_k (int): Top-k truncation, see sample_sentences.
+    top_p (float): Top-p truncation, see sample_sentences.
 
     Returns:
     list: A list of generated poems.
     """
-    data = read_and_parse_text(csv, column, category)
-    data = preprocess_text(data)
-    data = sentences_from_poems(data)
+    data = read_poem_lines(csv, column, category)
     
-    poems = [] 
+    states = train_states(data)
 
-    poems = generate_sentences(data, amount_of_poems)
+    poems = sample_sentences(
+        states, amount_of_poems, temperature, top_k, top_p
+    )
     
     for i in range(len(poems)):
         if poems[i] == "":
             while poems[i] == "":
-                poems[i] = generate_sentences(data, 1)[0]
+                poems[i] = sample_sentences(
+                    states, 1, temperature, top_k, top_p
+                )[0]
 
     poems = process_output_poems(poems, number_of_lines, number_of_words)
 
@@ -531,6 +422,7 @@ def display_menu_choice_for_default_data():
     print(
         f"Press 1 to generate poem(s) \n"
         "Press 2 to change training data source.\n"
+        "Press 3 to blend several training data sources.\n"
         "Press 0 to exit. \n"
     )
     return input("Enter choice: ")
@@ -540,17 +432,19 @@ def display_menu_for_non_default_data():
     print(
         f"Press 1 to generate sentences \n"
         "Press 2 to change training data source.\n"
+        "Press 3 to blend several training data sources.\n"
         "Press 0 to exit. \n"
     )
     return input("Enter choice: ")
 
 
-def get_integer_from_user(input_text : str):
+def get_integer_from_user(input_text : str, default : int = None):
     """
     Provides exception handling whengetting an integer from the user.
 
     Arguments:
     input_text (string): The text to display when asking for input.
+    default (int): Returned on blank input. If None, blank input is invalid.
 
     Returns:
     int: The integer input from the user.
@@ -558,13 +452,112 @@ def get_integer_from_user(input_text : str):
 
     while True:
         try:
-            number = int(input(input_text))
+            text = input(input_text)
+            if text == "" and default is not None:
+                return default
+            number = int(text)
             break
         except ValueError:
             print("Invalid input. Please enter a valid integer.")
     return number
 
 
+def get_float_from_user(input_text : str, default : float = None):
+    """
+    Provides exception handling when getting a number from the user.
+
+    Arguments:
+    input_text (string): The text to display when asking for input.
+    default (float): Returned on blank input. If None, blank input is invalid.
+
+    Returns:
+    float: The number input from the user.
+    """
+
+    while True:
+        try:
+            text = input(input_text)
+            if text == "" and default is not None:
+                return default
+            number = float(text)
+            break
+        except ValueError:
+            print("Invalid input. Please enter a valid number.")
+    return number
+
+
+def get_sampling_options_from_user():
+    """
+    Asks the user for the sampling options. Blank input keeps the default.
+
+    Returns:
+    tuple: The temperature, top-k and top-p to sample with.
+    """
+
+    temperature = -1.0
+    while temperature < 0:
+        temperature = get_float_from_user(
+            "Temperature (blank for 1, 0 for most likely words): ", 1.0
+        )
+    top_k = -1
+    while top_k < 0:
+        top_k = get_integer_from_user(
+            "Sample from the k most likely words (blank for all): ", 0
+        )
+    top_p = 0.0
+    while not 0 < top_p <= 1:
+        top_p = get_float_from_user(
+            "Sample from the most likely words up to this probability "
+            "(0-1, blank for 1): ", 1.0
+        )
+
+    return temperature, top_k, top_p
+
+
+def get_category_from_user():
+    """
+    Asks the user for one of the common poem categories.
+
+    Returns:
+    string: The chosen category, or None for all categories.
+    """
+
+    print("Is there a specific category you want to generate poems from: ")
+    for key, value in COMMON_TAGS.items():
+        if value is not None:
+            print(f"Press {key} for {value} poems")
+        else:
+            print(f"Press {key} for poems for all/no specific categories")
+
+    category = input("Enter choice: ")
+    return COMMON_TAGS[ category if category in COMMON_TAGS else "8"]
+
+
+def get_weights_from_user(sources : list) -> list:
+    """
+    Asks the user for one weight per blended source.
+
+    Arguments:
+    sources (list): Names of the blended sources.
+
+    Returns:
+    list: Non-negative weights, at least one of them positive.
+    """
+
+    if not sources:
+        raise ValueError("Expected at least one source to weight.")
+
+    while True:
+        weights = [
+            get_integer_from_user(f"Weight for {source} (e.g. 70): ")
+            for source in sources
+        ]
+        if any(weight < 0 for weight in weights) or sum(weights) == 0:
+            print("Weights must not be negative and not all zero.")
+        else:
+            return weights
+
+
 def generate_poems_for_default_data(data : str, column : str):
 
     """
@@ -580,27 +573,9 @@ def generate_poems_for_default_data(data : str, column : str):
     number_of_poems = get_integer_from_user("Number of poems to generate: ")
     number_of_lines = get_integer_from_user("Number of lines per poem: ")
     number_of_words = get_integer_from_user("Number of words per line: ")
+    category        = get_category_from_user()
 
-    common_tags : dict = { 
-        "1": "Time", 
-        "2": "Love", 
-        "3": "Nature", 
-        "4": "Social Commentaries", 
-        "5": "Mythology & Folklore", 
-        "6": "Arts & Sciences", 
-        "7": "Living", 
-        "8": None
-    }
-
-    print("Is there a specific category you want to generate poems from: ")
-    for key, value in common_tags.items():
-        if value is not None:
-            print(f"Press {key} for {value} poems")
-        else:
-            print(f"Press {key} for poems for all/no specific categories")
-
-    category = input("Enter choice: ")
-    category = common_tags[ category if category in common_tags else "8"]
+    temperature, top_k, top_p = get_sampling_options_from_user()
 
     poems = generate_poems(
         data, 
@@ -608,7 +583,10 @@ def generate_poems_for_default_data(data : str, column : str):
         number_of_poems,
         number_of_lines, 
         number_of_words, 
-        category
+        category,
+        temperature,
+        top_k,
+        top_p
     )
     save_poems = input("Save poems to file? (y/n): ")
 
@@ -633,14 +611,12 @@ def generate_sentences_for_non_default_data(folder : str):
         get_integer_from_user("Number of sentences to generate: ")
     )
 
-    sentences = []
-    for filename in os.listdir(folder):
-        with open(os.path.join(folder, filename), 'r') as file:
-            for line in file:
-                sentences.append(line.strip())
-    
-    sentences = preprocess_text(sentences)
-    generated_sentences = generate_sentences(sentences, number_of_sentences)
+    temperature, top_k, top_p = get_sampling_options_from_user()
+
+    sentences = read_folder_lines(folder)
+    generated_sentences = generate_sentences(
+        sentences, number_of_sentences, temperature, top_k, top_p
+    )
 
     for sentence in generated_sentences:
         print(sentence)
@@ -652,6 +628,67 @@ def generate_sentences_for_non_default_data(folder : str):
         pass
 
     
+def generate_blended_sentences(column : str):
+
+    """
+    Generates sentences from a weighted blend of several training data
+    sources, e.g. 70% Love poems and 30% Nature poems, or the default data
+    mixed with a folder of text files. Every source is trained once; 
+    changing the weights afterwards reuses the trained chains.
+
+    Arguments:
+    column (string): The name of the column to read from the default data.
+
+    """
+
+    number_of_sources = 0
+    while number_of_sources < 1:
+        number_of_sources = get_integer_from_user(
+            "Number of sources to blend (at least 1): "
+        )
+
+    sources = []
+    chains  = []
+    for i in range(number_of_sources):
+        print(f"Source {i + 1}. Blank input will use default data source.")
+        folder = input("Enter path for folder containing training data: ")
+        if folder == "":
+            category = get_category_from_user()
+            sources.append(DEFAULT_DATA + " (" + str(category) + ")")
+            chains.append(
+                train_states(read_poem_lines(DEFAULT_DATA, column, category))
+            )
+        else:
+            sources.append(folder)
+            chains.append(train_states(read_folder_lines(folder)))
+
+    model = MixtureModel(chains, get_weights_from_user(sources))
+
+    generated_sentences = []
+    while True:
+        number_of_sentences = (
+            get_integer_from_user("Number of sentences to generate: ")
+        )
+        temperature, top_k, top_p = get_sampling_options_from_user()
+        generated_sentences = sample_sentences(
+            model, number_of_sentences, temperature, top_k, top_p
+        )
+
+        for sentence in generated_sentences:
+            print(sentence)
+
+        change_weights = input("Change weights and generate again? (y/n): ")
+        if change_weights != "y":
+            break
+        model.set_weights(get_weights_from_user(sources))
+
+    save_sentences = input("Save sentences to file? (y/n): ")
+    if save_sentences == "y":
+        save_generated_text(generated_sentences)
+    elif save_sentences== "n":
+        pass
+
+
 def change_training_data_source():
     """
     Changes the training data source.
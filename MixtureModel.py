@@ -0,0 +1,141 @@
+import random as rand
+from WordState import WordState
+
+class MixtureModel:
+    """
+    Blends several already trained chains of WordStates at sample time.
+
+    Each chain (as returned by train_states) gets a weight. The next word
+    is drawn from the weighted combination of the chains' transition
+    distributions for the current word, so changing the weights does not
+    require any retraining. A word known to several chains is resolved to
+    one entry listing the states of every chain that continues it.
+    """
+
+    def __init__(self, chains, weights=None):
+        """
+        Arguments:
+        chains (list): A list of dictionaries mapping words to WordStates.
+        weights (list): One weight per chain. Defaults to equal weights.
+        """
+
+        self._ids = {} # Vocabulary index shared by all chains: word -> id.
+        self._words = [] # id -> word.
+        self._components = [] # id -> list of (chain index, WordState).
+
+        for index, chain in enumerate(chains):
+            for word, state in chain.items():
+                if word not in self._ids:
+                    self._ids[word] = len(self._words)
+                    self._words.append(word)
+                    self._components.append([])
+                if state.has_next():
+                    self._components[self._ids[word]].append((index, state))
+
+        self._number_of_chains = len(chains)
+        self._blended = {} # id -> WordState with the blended next word weights.
+        self.set_weights(weights)
+
+
+    def set_weights(self, weights=None):
+        """Replaces the weights of the chains. No data is reread or recounted."""
+
+        if weights is None:
+            weights = [1] * self._number_of_chains
+
+        if len(weights) != self._number_of_chains:
+            raise ValueError("Expected one weight per chain.")
+        if any(weight < 0 for weight in weights):
+            raise ValueError("Weights must not be negative.")
+        if sum(weights) == 0:
+            raise ValueError("At least one weight must be positive.")
+
+        self._weights = list(weights)
+        self._blended = {}
+
+
+    def __contains__(self, word):
+        return word in self._ids
+
+
+    def __getitem__(self, word):
+        """Returns a state for the word blending all chains that know it."""
+
+        return _MixtureWordState(self, self._ids[word])
+
+
+    def has_next(self, word_id):
+        """True if any chain with a non-zero weight continues the word."""
+
+        return any(
+            self._weights[index] > 0
+            for index, state in self._components[word_id]
+        )
+
+
+    def get_next(self, word_id, temperature=1.0, top_k=0, top_p=1.0):
+        """
+        Returns a random next word based on the blended probability.
+
+        Without sampling options a chain is picked in proportion to its
+        weight among the chains that continue the word, then the next word
+        is drawn from that chain, which samples exactly from the weighted
+        mixture. With any option set, the next word is drawn from the
+        merged table of the blended probabilities, so temperature, top-k
+        and top-p act on the mixture itself, see WordState.get_next.
+        """
+
+        if temperature != 1.0 or top_k != 0 or top_p != 1.0:
+            return self._blended_state(word_id).get_next(
+                temperature, top_k, top_p
+            )
+
+        components = self._components[word_id]
+        state = rand.choices(
+            [state for index, state in components],
+            weights=[self._weights[index] for index, state in components]
+        )[0]
+        return state.get_next(temperature, top_k, top_p)
+
+
+    def _blended_state(self, word_id):
+        """
+        Returns a WordState holding the weighted mixture of the chains' next
+        word probabilities. It is built on first use after the weights change.
+        """
+
+        if word_id not in self._blended:
+            blended = {}
+            for index, state in self._components[word_id]:
+                if self._weights[index] == 0:
+                    continue
+                next_words = state.next_words()
+                total = sum(next_words.values())
+                for word, count in next_words.items():
+                    blended[word] = (
+                        blended.get(word, 0)
+                        + self._weights[index] * count / total
+                    )
+            self._blended[word_id] = WordState.from_weights(blended)
+
+        return self._blended[word_id]
+
+
+class _MixtureWordState:
+    """
+    View of a single word in a MixtureModel, usable wherever a WordState is.
+    """
+
+    def __init__(self, model, word_id):
+        self._model = model
+        self._word_id = word_id
+
+
+    def has_next(self):
+        return self._model.has_next(self._word_id)
+
+
+    def get_next(self, temperature=1.0, top_k=0, top_p=1.0):
+        return self._model.get_next(
+            self._word_id, temperature, top_k, top_p
+        )
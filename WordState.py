@@ -1,4 +1,6 @@
 import random as rand
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
 
 class WordState:
     """
@@ -7,7 +9,22 @@ class WordState:
 
     def __init__(self):
         self._next_words = {} # A dict with all the next words and their frequencies.
-        
+        self._sorted_words = None # Next words sorted by frequency, most frequent first.
+        self._prefix_sums = None # Prefix sums of the sorted frequencies.
+        self._tempered = None # (temperature, prefix sums) of the last temperature used.
+
+
+    @classmethod
+    def from_weights(cls, weights):
+        """
+        Creates a state from precomputed, possibly fractional, next word
+        weights instead of counting words one by one.
+        """
+
+        state = cls()
+        state._next_words = dict(weights)
+        return state
+
 
     def add_next_word(self, next_word):
         """
@@ -20,19 +37,82 @@ class WordState:
         else:
             self._next_words[next_word] = 1
 
+        #precomputed tables are stale now
+        self._sorted_words = None
+        self._prefix_sums = None
+        self._tempered = None
+
 
     def has_next(self):
         """True if there are any more words following this one."""
 
         return bool(self._next_words)
-        
 
-    def get_next(self):
-        """Returns a random next word based on probability."""
 
-        return rand.choices(
-            list( self._next_words.keys() ), 
-            weights=list( self._next_words.values() )
-        )[0]
+    def next_words(self):
+        """Returns a dict with all the next words and their frequencies."""
+
+        return dict(self._next_words)
+
+
+    def _table(self, temperature):
+        """
+        Returns the next words sorted by frequency and the prefix sums of
+        their weights at the given temperature. The table for temperature 1
+        and the one for the last other temperature are kept for reuse.
+        """
+
+        if self._sorted_words is None:
+            self._sorted_words = sorted(
+                self._next_words, key=self._next_words.get, reverse=True
+            )
+            self._prefix_sums = list(accumulate(
+                self._next_words[word] for word in self._sorted_words
+            ))
+
+        if temperature == 1:
+            return self._sorted_words, self._prefix_sums
+
+        if self._tempered is None or self._tempered[0] != temperature:
+            #scaled by the largest frequency so no term exceeds 1
+            max_count = self._next_words[self._sorted_words[0]]
+            self._tempered = (temperature, list(accumulate(
+                (self._next_words[word] / max_count) ** (1 / temperature)
+                for word in self._sorted_words
+            )))
+
+        return self._sorted_words, self._tempered[1]
+
+
+    def get_next(self, temperature=1.0, top_k=0, top_p=1.0):
+        """
+        Returns a random next word based on probability.
+
+        Arguments:
+        temperature (float): Values below 1 favour frequent words, values
+                             above 1 flatten the distribution. 0 always
+                             returns the most frequent word.
+        top_k (int): Only draw from the k most frequent words. 0 for no limit.
+        top_p (float): Only draw from the most frequent words whose
+                       probabilities add up to at least top_p.
+        """
+
+        if temperature < 0:
+            raise ValueError("Temperature must not be negative.")
+
+        if temperature == 0:
+            return self._table(1.0)[0][0]
+
+        words, prefix_sums = self._table(temperature)
+
+        candidates = len(words)
+        if top_k > 0:
+            candidates = min(candidates, top_k)
+        if top_p < 1.0:
+            candidates = min(
+                candidates,
+                bisect_left(prefix_sums, top_p * prefix_sums[-1]) + 1
+            )
 
-            
\ No newline at end of file
+        draw = rand.random() * prefix_sums[candidates - 1]
+        return words[bisect_right(prefix_sums, draw, 0, candidates - 1)]